@@ -18,17 +18,27 @@ Example:
 
 import argparse
 import asyncio
+import codecs
+import functools
+import hashlib
+import contextlib
 import json
 import os
+import queue
 import re
+import secrets
 import sys
+import threading
 import time
 import urllib.parse
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from itertools import cycle
-from typing import List, Optional, Tuple, Dict, Set
+from typing import Callable, List, Optional, Tuple, Dict, Set
 
 import httpx
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import aiofiles
 
@@ -39,6 +49,31 @@ try:
 except Exception:
     PLAYWRIGHT_AVAILABLE = False
 
+# optional h2 (HTTP/2 support for httpx; without it httpx refuses http2=True)
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except Exception:
+    HTTP2_AVAILABLE = False
+
+# optional orjson (faster parsing of large wayback JSON dumps)
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+# optional lxml (crawler reads links straight off lxml.html; BeautifulSoup + html.parser otherwise)
+try:
+    import lxml.html
+except Exception:
+    lxml = None
+
+# optional pyahocorasick (single-pass multi-payload matching)
+try:
+    import ahocorasick
+except Exception:
+    ahocorasick = None
+
 # optional colorama
 try:
     from colorama import Fore, Style, init as colorama_init
@@ -64,177 +99,529 @@ CONCURRENCY_DEFAULT = 150
 RATE_LIMIT_PER_HOST = 0.02
 GLOBAL_RPS = 400
 REQUEST_TIMEOUT = 8.0
+MAX_BODY_BYTES = 512 * 1024
+BINARY_CONTENT_TYPES = ("image/", "audio/", "video/", "font/", "application/octet-stream", "application/pdf", "application/zip")
 SAVE_EVIDENCE = True
+MAX_PARAM_URLS = 500
+# verification only needs the DOM and JS: drop GPU, extensions, background services and images.
+# The sandbox stays on since the pages being checked are untrusted.
+PLAYWRIGHT_LAUNCH_OPTIONS = {"headless": True, "timeout": 15000, "args": [
+    "--disable-gpu", "--disable-dev-shm-usage", "--disable-extensions", "--disable-background-networking",
+    "--disable-renderer-backgrounding", "--disable-background-timer-throttling",
+    "--disable-features=Translate,BackForwardCache,AcceptCHFrame,MediaRouter",
+    "--blink-settings=imagesEnabled=false", "--mute-audio"]}
+PLAYWRIGHT_CONTEXT_OPTIONS = {"ignore_https_errors": True, "service_workers": "block"}
+PLAYWRIGHT_BLOCKED_RESOURCES = frozenset({"image", "font", "media", "stylesheet"})
+BROWSER_POOL_RECYCLE_AFTER = 100
+PLAYWRIGHT_CONCURRENCY = 4
+PLAYWRIGHT_PER_HOST = 2
+SYNC_POOL_SIZE = 32
+CRAWL_WORKERS = 8
+PROXY_CHECK_WORKERS = 32
+
+# shared keep-alive session for the synchronous recon requests (wayback + crawler)
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=SYNC_POOL_SIZE, pool_maxsize=SYNC_POOL_SIZE, max_retries=0)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
 
 # ---------------------
 # small helpers
 # ---------------------
 def ensure_dir(p): os.makedirs(p, exist_ok=True); return p
+_SAFE_CHARS = b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz-_."
+_SAFE_TBL = bytes(c if c in _SAFE_CHARS else ord("_") for c in range(256))
 def safe_name_for_file(s: str) -> str:
-    return re.sub(r'[^0-9A-Za-z\-_\.]', '_', s)[:220]
+    # one C-level bytes.translate instead of a regex substitution; non-ASCII becomes '?' -> '_'
+    return s[:220].encode("ascii", "replace").translate(_SAFE_TBL).decode("ascii")
 def load_payloads(path: str) -> List[str]:
     if os.path.exists(path):
         with open(path, encoding='utf-8', errors='ignore') as f:
             return [l.strip() for l in f if l.strip()]
     return []
 
+# (raw, url-quoted, url-decoded) — computed once per scan, not once per URL
+Payload = Tuple[str, str, str]
+def prepare_payloads(payloads: List[str]) -> List[Payload]:
+    return [(p, urllib.parse.quote(p), urllib.parse.unquote_plus(p)) for p in payloads]
+
 # ---------------------
 # inject payload into query string (all params)
 # ---------------------
-def inject_payload(url: str, payload: str) -> str:
+@functools.lru_cache(maxsize=65536)
+def url_host(url: str) -> str:
+    # netloc of a URL; the crawler checks the same nav links on every page and the scan sorts
+    # and rate-limits by host, so repeated parses are served from the cache
+    return urllib.parse.urlsplit(url).netloc
+
+def split_query(url: str) -> Tuple[str, List[str]]:
+    # (base, param names) — parsed once per URL and reused for every payload batch
     if "?" not in url:
-        return url
+        return url, []
     base, qs = url.split("?", 1)
-    parts = []
-    for p in qs.split("&"):
-        if "=" in p:
-            k, v = p.split("=", 1)
-            parts.append(f"{k}={urllib.parse.quote(payload)}")
+    return base, [p.split("=", 1)[0] for p in qs.split("&")]
+
+def build_test_url(base: str, keys: List[str], quoted: List[str]) -> str:
+    # parameter i carries quoted[i % len(quoted)], so one request can test several payloads;
+    # `base` may already carry fixed params
+    if not keys:
+        return base
+    sep = "&" if "?" in base else "?"
+    return f"{base}{sep}" + "&".join(f"{k}={quoted[i % len(quoted)]}" for i, k in enumerate(keys))
+
+def is_param_url(url: str) -> bool:
+    # one definition for every call site; two C-level substring checks beat a regex search here
+    return "?" in url or "=" in url
+
+def url_signature(url: str) -> Tuple[str, str, str, Tuple[str, ...]]:
+    # URLs that differ only in parameter values exercise the same injection surface
+    parts = urllib.parse.urlsplit(url)
+    keys = tuple(sorted({k for k, _ in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)}))
+    return (parts.scheme.lower(), parts.netloc.lower(), parts.path, keys)
+
+def dedupe_by_signature(urls: List[str]) -> List[str]:
+    reps: Dict[Tuple[str, str, str, Tuple[str, ...]], str] = {}
+    for u in urls:
+        reps.setdefault(url_signature(u), u)
+    return list(reps.values())
+
+# ---------------------
+# payload matching
+# ---------------------
+SKELETON_MIN_ALNUM = 6
+SKELETON_GAP_PER_CHAR = 20
+# a gap char that doesn't start a %XX escape: a percent-encoded echo of the test URL (canonical
+# links, form actions) is the sanitized outcome, and the URL-decoded form is the literal pass's job
+_GAP = r"(?:(?!%[0-9A-Fa-f]{2}).)"
+_RE_TOKENS = re.compile(r"[A-Za-z0-9]+|[^A-Za-z0-9]+")
+_RE_ALNUM = re.compile(r"[A-Za-z0-9]+")
+
+@functools.lru_cache(maxsize=4096)
+def skeleton_pattern(payload: str) -> Optional[re.Pattern]:
+    # alphanumeric runs must come back in order (any case); each run of special chars may be
+    # re-encoded as up to SKELETON_GAP_PER_CHAR characters per original char
+    parts, alnum, special = [], 0, False
+    for tok in _RE_TOKENS.findall(payload):
+        if tok[0].isascii() and tok[0].isalnum():
+            parts.append(re.escape(tok)); alnum += len(tok)
         else:
-            parts.append(f"{p}={urllib.parse.quote(payload)}")
-    return f"{base}?{'&'.join(parts)}"
+            special = True
+            if parts:
+                parts.append("%s{0,%d}?" % (_GAP, SKELETON_GAP_PER_CHAR * len(tok)))
+    if parts and parts[-1].startswith(_GAP):
+        parts.pop()
+    # payloads without special chars are covered by the literal check; too little
+    # alphanumeric text would match ordinary page content
+    if not special or alnum < SKELETON_MIN_ALNUM:
+        return None
+    return re.compile("".join(parts), re.I)
+
+class PayloadMatcher:
+    # one Aho-Corasick automaton over every raw + decoded payload, built once per scan;
+    # without pyahocorasick it falls back to per-payload `in` checks
+    def __init__(self, payloads: List[Payload]):
+        self.payloads = payloads
+        self.max_len = max((max(len(p), len(dec)) for p, _, dec in payloads), default=0)
+        self._automaton = None
+        if ahocorasick is not None and payloads:
+            A = ahocorasick.Automaton()
+            for i, (p, _, dec) in enumerate(payloads):
+                for word in {p, dec}:
+                    if not word: continue
+                    idxs = A.get(word) if word in A else []
+                    idxs.append(i)
+                    A.add_word(word, idxs)
+            A.make_automaton()
+            self._automaton = A
+        self._skeletons = [skeleton_pattern(p) for p, _, _ in payloads]
+        # longest alphanumeric run of each payload, lowercased: a skeleton can only match
+        # a response that contains it, which is a cheap substring test
+        self._anchors = [max(_RE_ALNUM.findall(p), key=len, default="").lower() for p, _, _ in payloads]
+
+    def find_encoded(self, text: str, start: int, stop: int) -> Optional[int]:
+        # fallback for reflections a sanitizer re-encoded (HTML entities, JS/CSS escapes)
+        low = None
+        for i in range(start, stop):
+            pat = self._skeletons[i]
+            if pat is None:
+                continue
+            if low is None:
+                low = text.lower()
+            if self._anchors[i] not in low:
+                continue
+            if pat.search(text):
+                return i
+        return None
+
+    def find(self, text: str, start: int, stop: int) -> Optional[int]:
+        # index of a payload in payloads[start:stop] that appears in text
+        if self._automaton is not None:
+            for _, idxs in self._automaton.iter(text):
+                for i in idxs:
+                    if start <= i < stop:
+                        return i
+            return None
+        for i in range(start, stop):
+            p, _, dec = self.payloads[i]
+            if p in text or dec in text:
+                return i
+        return None
 
 # ---------------------
 # Wayback + crawler
 # ---------------------
 def load_wayback(domain: str, limit: int = 500) -> List[str]:
-    out = []
+    out, seen = [], set()
+    q = urllib.parse.quote(f"*.{domain}/*")
     try:
-        q = urllib.parse.quote(f"*.{domain}/*")
-        url = f"http://web.archive.org/cdx/search/cdx?url={q}&output=json&fl=original&collapse=urlkey&limit={limit}"
-        r = requests.get(url, timeout=12, headers={"User-Agent":"xrayxss/1.0"})
-        r.raise_for_status()
-        data = r.json()
-        for item in data[1:]:
-            cand = item[0] if isinstance(item, list) else item
-            if cand and cand not in out:
-                out.append(cand)
-            if len(out) >= limit:
-                break
-    except Exception:
-        try:
-            url2 = f"http://web.archive.org/cdx/search/cdx?url=*.{domain}/*&output=text&fl=original&collapse=urlkey&limit={limit}"
-            r2 = requests.get(url2, timeout=12, headers={"User-Agent":"xrayxss/1.0"})
-            r2.raise_for_status()
-            for line in r2.text.splitlines():
-                line=line.strip()
-                if line and line not in out:
+        # text output streams one URL per line: dedupe as lines arrive and stop reading at `limit`
+        url = f"http://web.archive.org/cdx/search/cdx?url={q}&output=text&fl=original&collapse=urlkey&limit={limit}"
+        with SESSION.get(url, timeout=12, stream=True, headers={"User-Agent":"xrayxss/1.0"}) as r:
+            r.raise_for_status()
+            # text/plain without a charset would make requests decode as ISO-8859-1; CDX is UTF-8
+            for raw in r.iter_lines():
+                line = raw.decode("utf-8", "replace").strip()
+                if line and line not in seen:
+                    seen.add(line)
                     out.append(line)
                     if len(out) >= limit:
                         break
+    except Exception:
+        try:
+            url2 = f"http://web.archive.org/cdx/search/cdx?url={q}&output=json&fl=original&collapse=urlkey&limit={limit}"
+            r2 = SESSION.get(url2, timeout=12, headers={"User-Agent":"xrayxss/1.0"})
+            r2.raise_for_status()
+            data = orjson.loads(r2.content) if orjson else r2.json()
+            for item in data[1:]:
+                cand = item[0] if isinstance(item, list) else item
+                if cand and cand not in seen:
+                    seen.add(cand)
+                    out.append(cand)
+                if len(out) >= limit:
+                    break
         except Exception:
             print(Fore.YELLOW + f"[!] Wayback fetch failed for {domain}" + Style.RESET_ALL)
     return out
 
-def extract_param_urls_from_html(text: str, base_url: str) -> List[str]:
+def page_links(content: bytes, encoding: Optional[str] = None) -> Tuple[List[str], List[Tuple[str, List[str]]]]:
+    # raw <a href> values plus (action, input names) per <form action>. lxml.html reads them
+    # with XPath in C without building a Python object per tag; BeautifulSoup is the fallback.
+    # `encoding` is the charset from the HTTP header, which wins over the document's own guess
+    if not content.strip():
+        return [], []
+    if lxml is not None:
+        doc = lxml.html.fromstring(content, parser=lxml.html.HTMLParser(encoding=encoding) if encoding else None)
+        # smart_strings=False: plain str results, not ones that keep the whole parsed tree alive
+        # (they end up in the frontier, the results and the url_host cache)
+        return (doc.xpath("//a/@href", smart_strings=False),
+                [(f.get("action"), f.xpath(".//input/@name", smart_strings=False)) for f in doc.xpath("//form[@action]")])
+    soup = BeautifulSoup(content, "html.parser", from_encoding=encoding)
+    return ([a['href'] for a in soup.find_all("a", href=True)],
+            [(f['action'], [i.get("name") for i in f.find_all("input", attrs={"name": True})]) for f in soup.find_all("form", action=True)])
+
+def param_urls_from_links(hrefs: List[str], forms: List[Tuple[str, List[str]]], base_url: str) -> List[str]:
     out = []
     try:
-        soup = BeautifulSoup(text, "html.parser")
-        for a in soup.find_all("a", href=True):
-            full = urllib.parse.urljoin(base_url, a['href'])
-            if "?" in full or "=" in full:
+        for href in hrefs:
+            full = urllib.parse.urljoin(base_url, href)
+            if is_param_url(full):
                 out.append(full)
-        for form in soup.find_all("form", action=True):
-            act = urllib.parse.urljoin(base_url, form['action'])
-            if "?" in act or "=" in act:
+        for action, inputs in forms:
+            act = urllib.parse.urljoin(base_url, action)
+            if is_param_url(act):
                 out.append(act)
-            else:
-                inputs = [i.get("name") for i in form.find_all("input", attrs={"name": True})]
-                if inputs:
-                    qs = "&".join(f"{n}=1" for n in inputs)
-                    out.append(act + ("?" + qs if "?" not in act else "&" + qs))
+            elif inputs:
+                qs = "&".join(f"{n}=1" for n in inputs)
+                out.append(act + ("?" + qs if "?" not in act else "&" + qs))
     except Exception:
         pass
     return out
 
-def crawl_site(start_url: str, max_depth: int = 1, max_pages: int = 200) -> List[str]:
+def _norm(u: str) -> bytes:
+    # crawl dedupe key: 8-byte blake2b of the canonical form (lowercase scheme/host, no trailing
+    # slash, sorted query, no fragment), so visited/found sets don't hold a second copy of each URL
+    parts = urllib.parse.urlsplit(u)
+    path = parts.path.rstrip("/")
+    query = "&".join(sorted(parts.query.split("&"))) if parts.query else ""
+    canon = urllib.parse.urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ""))
+    return hashlib.blake2b(canon.encode("utf-8", "surrogatepass"), digest_size=8).digest()
+
+_RE_CHARSET = re.compile(r"charset=[\"']?([\w.:-]+)", re.I)
+def header_charset(content_type: str) -> Optional[str]:
+    # charset declared in a Content-Type header, if Python knows it; None leaves it to the parser
+    m = _RE_CHARSET.search(content_type or "")
+    if not m:
+        return None
+    try:
+        return codecs.lookup(m.group(1)).name
+    except LookupError:
+        return None
+
+def _fetch_links(url: str) -> Tuple[List[str], List[Tuple[str, List[str]]]]:
+    r = SESSION.get(url, timeout=6, verify=False, headers={"User-Agent":"xrayxss-crawler/1.0"})
+    # parse once and reuse the links for both param URLs and the crawl frontier. Raw bytes plus
+    # the header charset skip requests' guessing on r.text; without a header charset the parser
+    # falls back to the document's <meta charset>
+    return page_links(r.content or b"", header_charset(r.headers.get("content-type", "")))
+
+def crawl_site(start_url: str, max_depth: int = 1, max_pages: int = 200, max_found: int = MAX_PARAM_URLS, workers: int = CRAWL_WORKERS) -> List[str]:
     from urllib.parse import urljoin
-    domain = urllib.parse.urlparse(start_url).netloc
-    visited, q, found = set(), [(start_url, 0)], []
-    while q and len(visited) < max_pages:
-        url, depth = q.pop(0)
-        if url in visited or depth > max_depth:
-            continue
-        visited.add(url)
-        try:
-            r = requests.get(url, timeout=6, verify=False, headers={"User-Agent":"xrayxss-crawler/1.0"})
-            for u in extract_param_urls_from_html(r.text or "", url):
-                if domain in urllib.parse.urlparse(u).netloc and u not in visited:
-                    found.append(u)
-            soup = BeautifulSoup(r.text or "", "html.parser")
-            for link in soup.find_all("a", href=True):
-                full = urljoin(url, link['href'])
-                if domain in urllib.parse.urlparse(full).netloc and full not in visited:
-                    q.append((full, depth+1))
-        except Exception:
-            continue
-    return sorted(set(found))
+    domain = url_host(start_url)
+    visited: Set[bytes] = set()
+    q = deque([(start_url, 0)])
+    # first spelling of each normalized URL, keyed on its digest
+    found: Dict[bytes, str] = {}
+    # pages are fetched on a thread pool; the frontier and visited/found sets are
+    # only touched on this thread, so they need no locking
+    inflight: Dict[Future, Tuple[str, int]] = {}
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        while (q or inflight) and len(found) < max_found:
+            while q and len(inflight) < workers and len(visited) < max_pages:
+                url, depth = q.popleft()
+                key = _norm(url)
+                if key in visited or depth > max_depth:
+                    continue
+                visited.add(key)
+                inflight[ex.submit(_fetch_links, url)] = (url, depth)
+            if not inflight:
+                break
+            done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                url, depth = inflight.pop(fut)
+                try:
+                    hrefs, forms = fut.result()
+                    for u in param_urls_from_links(hrefs, forms, url):
+                        if len(found) >= max_found:
+                            break
+                        k = _norm(u)
+                        if domain in url_host(u) and k not in visited:
+                            found.setdefault(k, u)
+                    if depth + 1 > max_depth:
+                        continue
+                    for href in hrefs:
+                        full = urljoin(url, href)
+                        if domain in url_host(full) and _norm(full) not in visited:
+                            q.append((full, depth+1))
+                except Exception:
+                    continue
+        for fut in inflight:
+            fut.cancel()
+    return sorted(found.values())
 
 # ---------------------
 # rate limiters + httpx helpers
 # ---------------------
+# Both limiters reserve a time slot and then sleep outside of any lock. The
+# reservation has no await in it, so it is atomic on the event loop, and a
+# host that is waiting no longer blocks callers for every other host.
 class HostRateLimiter:
     def __init__(self, min_delay: float):
         self.min_delay = min_delay
-        self._last: Dict[str, float] = {}
-        self._lock = asyncio.Lock()
+        self._next: Dict[str, float] = {}
     async def wait(self, host: str):
-        async with self._lock:
-            now = time.monotonic(); last = self._last.get(host, 0.0)
-            wait_for = self.min_delay - (now - last)
-            if wait_for > 0: await asyncio.sleep(wait_for)
-            self._last[host] = time.monotonic()
+        now = time.monotonic(); slot = max(now, self._next.get(host, 0.0))
+        self._next[host] = slot + self.min_delay
+        if slot > now: await asyncio.sleep(slot - now)
 
 class GlobalRateLimiter:
+    # token bucket: up to `rps` calls pass at once after an idle spell, the sustained rate stays at `rps`;
+    # tokens may go negative, which reserves a future slot for the caller
     def __init__(self, rps: int):
-        self._interval = 1.0 / max(1, rps); self._lock = asyncio.Lock(); self._last = 0.0
+        self._rate = float(max(1, rps)); self._tokens = self._rate; self._t = time.monotonic()
     async def wait(self):
-        async with self._lock:
-            now = time.monotonic(); elapsed = now - self._last
-            if elapsed < self._interval: await asyncio.sleep(self._interval - elapsed)
-            self._last = time.monotonic()
+        now = time.monotonic()
+        self._tokens = min(self._rate, self._tokens + (now - self._t) * self._rate) - 1; self._t = now
+        if self._tokens < 0: await asyncio.sleep(-self._tokens / self._rate)
 
-async def fetch_text(client: httpx.AsyncClient, url: str, timeout: float) -> Optional[str]:
+async def fetch_response(client: httpx.AsyncClient, url: str, timeout: float, stop: Optional[Callable[[str], bool]] = None, overlap: int = 0, skip_binary: bool = False) -> Optional[Tuple[str, httpx.Headers]]:
+    # stream and stop after MAX_BODY_BYTES so huge pages don't get downloaded in full; if `stop`
+    # is given it sees each decoded chunk plus the previous `overlap` chars, and returning True
+    # ends the download early with the text read so far. With `skip_binary`, a binary
+    # Content-Type returns None from the headers alone, before any body byte is read
     try:
-        r = await client.get(url, timeout=timeout)
-        return r.text or ""
+        async with client.stream("GET", url, timeout=timeout) as r:
+            if skip_binary and r.headers.get("content-type", "").lower().startswith(BINARY_CONTENT_TYPES):
+                return None
+            decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")(errors="replace")
+            parts, size, tail = [], 0, ""
+            async for chunk in r.aiter_bytes():
+                chunk = chunk[:MAX_BODY_BYTES - size]; size += len(chunk)
+                piece = decoder.decode(chunk)
+                parts.append(piece)
+                if stop is not None and piece:
+                    window = tail + piece
+                    if stop(window):
+                        break
+                    tail = window[-overlap:] if overlap else ""
+                if size >= MAX_BODY_BYTES:
+                    break
+            parts.append(decoder.decode(b"", final=True))
+            return "".join(parts), r.headers
     except Exception:
         return None
 
-async def test_payloads_on_url(client: httpx.AsyncClient, url: str, payloads: List[str], timeout: float) -> Optional[Tuple[str,str,str]]:
-    for p in payloads:
-        test = inject_payload(url, p)
-        text = await fetch_text(client, test, timeout)
-        if text is None: continue
-        dec = urllib.parse.unquote_plus(p)
-        if p in text or dec in text:
-            return (test, p, text)
-    return None
+async def probe_reflection(client: httpx.AsyncClient, url: str, timeout: float, query: Optional[Tuple[str, List[str]]] = None) -> Optional[Tuple[str, List[str]]]:
+    # one request with a distinct random marker per param. Returns the (base, keys) to inject
+    # payloads into: params that didn't echo their marker keep their original value and move
+    # into the base. None means nothing reflects (or the response is binary) — skip the URL.
+    base, keys = query or split_query(url)
+    token = "ZF" + secrets.token_hex(6)
+    markers = [f"{token}_{i}_" for i in range(max(1, len(keys)))]
+    res = await fetch_response(client, build_test_url(base, keys, markers), timeout, skip_binary=True)
+    if not res:
+        return None
+    text, headers = res
+    # header values count too, since the payload passes also scan the header block
+    text = "\n".join([text, *headers.values()])
+    if token not in text:
+        return None
+    if not keys:
+        return base, keys
+    reflected = [k for k, m in zip(keys, markers) if m in text]
+    if not reflected:
+        # only a fragment of the token came back (truncated values): no param can carry a payload
+        return None
+    if len(reflected) == len(keys):
+        return base, keys
+    values = dict(urllib.parse.parse_qsl(url.split("?", 1)[1], keep_blank_values=True))
+    fixed = [f"{k}={urllib.parse.quote(values.get(urllib.parse.unquote_plus(k), ''))}" for k in keys if k not in reflected]
+    return f"{base}?{'&'.join(fixed)}", reflected
+
+async def test_payloads_on_url(client: httpx.AsyncClient, url: str, matcher: PayloadMatcher, timeout: float, query: Optional[Tuple[str, List[str]]] = None) -> Optional[Tuple[str,str,str,bool]]:
+    # bundle one payload per parameter: ceil(len(payloads) / params) requests instead of len(payloads);
+    # returns (test_url, payload, text, exact) — exact is False for an encoded-only or header-only
+    # reflection
+    payloads = matcher.payloads
+    base, keys = query or split_query(url)
+    width = max(1, len(keys))
+    encoded = None
+    # filters that strip payloads often return the same page for every batch; a body whose
+    # digest was already scanned can't hold a new reflection, so skip rescanning it
+    seen: Set[bytes] = set()
+    for i in range(0, len(payloads), width):
+        batch = payloads[i:i+width]
+        test = build_test_url(base, keys, [quoted for _, quoted, _ in batch])
+        j = i + len(batch)
+        res = await fetch_response(client, test, timeout, stop=lambda w: matcher.find(w, i, j) is not None, overlap=matcher.max_len - 1)
+        if res is None: continue
+        text, headers = res
+        if encoded is None:
+            # whole header block in one automaton pass, names included (Location, Set-Cookie, ...)
+            head = "\r\n".join(f"{k}: {v}" for k, v in headers.items())
+            hit = matcher.find(head, i, j)
+            if hit is not None:
+                encoded = (test, payloads[hit][0], head + "\r\n\r\n" + text, False)
+        digest = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        if digest in seen: continue
+        seen.add(digest)
+        hit = matcher.find(text, i, j)
+        if hit is not None:
+            return (test, payloads[hit][0], text, True)
+        if encoded is None:
+            hit = matcher.find_encoded(text, i, j)
+            if hit is not None:
+                encoded = (test, payloads[hit][0], text, False)
+    return encoded
 
 def make_session_factory(proxies_cycle: Optional[cycle], verify_tls: bool, limits: Optional[httpx.Limits]=None, http2: bool=True):
+    # one long-lived client per proxy: every URL shares its pooled keep-alive connections
+    clients: Dict[Optional[str], httpx.AsyncClient] = {}
     def factory():
         proxy = None
         if proxies_cycle:
             proxy = next(proxies_cycle)
-        client = httpx.AsyncClient(http2=http2, verify=verify_tls, timeout=REQUEST_TIMEOUT, limits=limits)
-        if proxy:
-            client._proxies = {"all://": proxy}
+        client = clients.get(proxy)
+        if client is None:
+            client = httpx.AsyncClient(http2=http2, verify=verify_tls, timeout=REQUEST_TIMEOUT, limits=limits)
+            if proxy:
+                client._proxies = {"all://": proxy}
+            clients[proxy] = client
         return client
+    async def aclose():
+        for client in clients.values():
+            await client.aclose()
+        clients.clear()
+    factory.aclose = aclose
     return factory
 
 # ---------------------
 # Playwright verification
 # ---------------------
-async def playwright_verify(url: str, payload: str, timeout=12.0) -> bool:
-    if not PLAYWRIGHT_AVAILABLE: return False
+async def _route_filter(route):
+    # subresources a reflected payload never depends on are aborted before they hit the network
+    if route.request.resource_type in PLAYWRIGHT_BLOCKED_RESOURCES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+class BrowserPool:
+    # one Playwright driver + Chromium per scan; every check gets its own BrowserContext.
+    # The browser is relaunched every `recycle_after` contexts to bound native memory drift;
+    # a retired browser is closed once its last in-flight context is released.
+    def __init__(self, recycle_after: int = BROWSER_POOL_RECYCLE_AFTER):
+        self._recycle_after = recycle_after
+        self._pw = None
+        self._browser = None
+        self._uses = 0
+        self._active: Dict[object, int] = {}
+        self._lock = asyncio.Lock()
+
+    async def _acquire(self):
+        async with self._lock:
+            if self._pw is None:
+                self._pw = await async_playwright().start()
+            if self._browser is None or self._uses >= self._recycle_after:
+                old, self._browser = self._browser, None
+                if old is not None and not self._active.get(old):
+                    self._active.pop(old, None)
+                    await old.close()
+                self._browser = await self._pw.chromium.launch(**PLAYWRIGHT_LAUNCH_OPTIONS)
+                self._uses = 0
+            self._uses += 1
+            self._active[self._browser] = self._active.get(self._browser, 0) + 1
+            return self._browser
+
+    async def _release(self, browser):
+        self._active[browser] -= 1
+        if browser is not self._browser and not self._active[browser]:
+            del self._active[browser]
+            await browser.close()
+
+    @contextlib.asynccontextmanager
+    async def context(self):
+        browser = await self._acquire()
+        try:
+            ctx = await browser.new_context(**PLAYWRIGHT_CONTEXT_OPTIONS)
+            try:
+                await ctx.route("**/*", _route_filter)
+                yield ctx
+            finally:
+                await ctx.close()
+        finally:
+            await self._release(browser)
+
+    async def close(self):
+        browsers = set(self._active)
+        if self._browser is not None:
+            browsers.add(self._browser)
+        for browser in browsers:
+            try:
+                await browser.close()
+            except Exception:
+                pass
+        self._active.clear(); self._browser = None
+        if self._pw is not None:
+            await self._pw.stop()
+            self._pw = None
+
+async def playwright_verify(pool: Optional[BrowserPool], url: str, payload: str, timeout=12.0) -> bool:
+    if pool is None: return False
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
+        async with pool.context() as ctx:
+            page = await ctx.new_page()
             await page.goto(url, timeout=timeout*1000)
             await asyncio.sleep(1.0)
             content = await page.content()
-            await browser.close()
             return payload in content
     except Exception:
         return False
@@ -273,19 +660,18 @@ function receiveReport(obj){
             await f.write(simple)
     return path
 
-async def append_to_dashboard(outdir: str, html_filename: str, url: str, payload: str, status: str='vulnerable', safe_name: str=""):
-    path = os.path.join(outdir, html_filename)
+def dashboard_row(url: str, payload: str, status: str='vulnerable', safe_name: str="") -> str:
     ts = time.strftime('%Y-%m-%d %H:%M:%S')
     obj = {'url': url, 'payload': payload, 'status': status, 'ts': ts, 'safe': safe_name}
-    js = f"<script>try{{ if(typeof receiveReport==='function') receiveReport({json.dumps(obj)}); else console.warn('no receiveReport'); }}catch(e){{console.error(e)}}</script>\n"
-    async with aiofiles.open(path, "a", encoding="utf-8") as f:
-        await f.write(js)
+    return f"<script>try{{ if(typeof receiveReport==='function') receiveReport({json.dumps(obj)}); else console.warn('no receiveReport'); }}catch(e){{console.error(e)}}</script>\n"
 
 # ---------------------
 # proxy health-check helper (sync simple)
 # ---------------------
 def proxy_health_check_sync(proxy: str, test_url="https://httpbin.org/ip", timeout=8.0):
     try:
+        # plain requests.get: each call goes through a different proxy, and a shared session would
+        # keep one pooled ProxyManager (and its socket) per proxy alive for the whole run
         r = requests.get(test_url, proxies={"http": proxy, "https": proxy}, timeout=timeout)
         if r.status_code == 200:
             return True, r.text.strip()
@@ -296,91 +682,152 @@ def proxy_health_check_sync(proxy: str, test_url="https://httpbin.org/ip", timeo
 # ---------------------
 # Orchestration
 # ---------------------
-async def worker_job(url: str, smoke_payloads: List[str], full_payloads: Optional[List[str]], session_factory, host_rl: HostRateLimiter, global_rl: GlobalRateLimiter, found_q: asyncio.Queue, timeout: float):
-    parsed = urllib.parse.urlparse(url)
-    host = parsed.netloc
+def write_evidence(fn: str, payload: str, text: str):
+    # header + body in one writev on a raw fd, no Python file object or text-mode buffering
+    bufs = [f"<!-- payload: {payload} -->\n".encode("utf-8", "replace"), (text or "").encode("utf-8", "replace")]
+    fd = os.open(fn, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        if hasattr(os, "writev"):
+            os.writev(fd, bufs)
+        else:
+            os.write(fd, b"".join(bufs))
+    finally:
+        os.close(fd)
+
+def append_text(fn: str, data: str):
+    with open(fn, "a", encoding="utf-8") as f:
+        f.write(data)
+
+def disk_writer(io_q: queue.SimpleQueue):
+    # drains (func, args) write jobs in FIFO order until a None sentinel
+    while True:
+        item = io_q.get()
+        if item is None:
+            break
+        func, args = item
+        try:
+            func(*args)
+        except Exception:
+            pass
+
+async def worker_job(url: str, smoke: PayloadMatcher, full: Optional[PayloadMatcher], session_factory, host_rl: HostRateLimiter, global_rl: GlobalRateLimiter, found_q: asyncio.Queue, timeout: float):
+    host = url_host(url)
     await host_rl.wait(host)
     await global_rl.wait()
     client: httpx.AsyncClient = session_factory()
-    try:
-        res = await test_payloads_on_url(client, url, smoke_payloads, timeout)
-        if res:
-            test_url, p, text = res
-            await found_q.put((test_url, p, text, url))
-            if full_payloads:
-                await asyncio.sleep(0.01)
-                full_res = await test_payloads_on_url(client, url, full_payloads, timeout)
-                if full_res:
-                    await found_q.put((full_res[0], full_res[1], full_res[2], url))
-    finally:
-        await client.aclose()
+    # split the URL once; the probe narrows it to the reflecting params and both payload
+    # passes build their test URLs from the result
+    query = await probe_reflection(client, url, timeout, split_query(url))
+    if query is None:
+        return
+    res = await test_payloads_on_url(client, url, smoke, timeout, query)
+    if res:
+        test_url, p, text, exact = res
+        await found_q.put((test_url, p, text, url, exact))
+        # an encoded or header-only smoke hit is only a suspect; don't spend the full pass on it
+        if full and exact:
+            await asyncio.sleep(0.01)
+            full_res = await test_payloads_on_url(client, url, full, timeout, query)
+            if full_res:
+                await found_q.put((full_res[0], full_res[1], full_res[2], url, full_res[3]))
 
-async def run_scan(urls: List[str], smoke_payloads: List[str], full_payloads: Optional[List[str]], concurrency: int, proxies: List[str], outdir: str, html_filename: str, verify_with_playwright: bool, template_path: Optional[str]=None):
+async def run_scan(urls: List[str], smoke_payloads: List[Payload], full_payloads: Optional[List[Payload]], concurrency: int, proxies: List[str], outdir: str, html_filename: str, verify_with_playwright: bool, template_path: Optional[str]=None):
     ensure_dir(outdir)
     await write_dashboard_initial(outdir, html_filename, template_path)
     limits = httpx.Limits(max_keepalive_connections=max(10, concurrency//2), max_connections=max(50, concurrency*2))
     proxies_cycle = cycle(proxies) if proxies else None
-    session_factory = make_session_factory(proxies_cycle, verify_tls=True, limits=limits, http2=True)
+    # HTTP/2 multiplexes the workers' requests to a host over one connection instead of one socket each
+    if not HTTP2_AVAILABLE:
+        print(Fore.YELLOW + "[!] h2 not installed, falling back to HTTP/1.1 (pip install \"httpx[http2]\")" + Style.RESET_ALL)
+    session_factory = make_session_factory(proxies_cycle, verify_tls=True, limits=limits, http2=HTTP2_AVAILABLE)
 
     host_rl = HostRateLimiter(RATE_LIMIT_PER_HOST)
     global_rl = GlobalRateLimiter(GLOBAL_RPS)
 
-    sem = asyncio.Semaphore(concurrency)
+    smoke = PayloadMatcher(smoke_payloads)
+    full = PayloadMatcher(full_payloads) if full_payloads else None
+    browser_pool = BrowserPool() if (verify_with_playwright and PLAYWRIGHT_AVAILABLE) else None
+
     found_q: asyncio.Queue = asyncio.Queue()
-    tasks = []
 
-    async def sem_job(u):
-        async with sem:
-            await worker_job(u, smoke_payloads, full_payloads, session_factory, host_rl, global_rl, found_q, REQUEST_TIMEOUT)
+    # keep each host's URLs together so they run on connections that are already warm
+    pending = iter(sorted(urls, key=url_host))
 
-    for u in urls:
-        tasks.append(asyncio.create_task(sem_job(u)))
+    # a fixed pool of `concurrency` workers pulls from the shared iterator, instead of
+    # one task per URL parked on a semaphore
+    async def scan_worker():
+        for u in pending:
+            await worker_job(u, smoke, full, session_factory, host_rl, global_rl, found_q, REQUEST_TIMEOUT)
 
     hits_set: Set[str] = set()
+    # what goes to xss_found_urls.txt: exact hits, plus suspects the browser confirmed
+    confirmed_hits: Set[str] = set()
 
+    # evidence files and dashboard rows are written by a single background thread, so
+    # neither the consumer nor the report tasks wait on disk
+    ev_dir = ensure_dir(os.path.join(outdir, "evidence")) if SAVE_EVIDENCE else ""
+    dashboard_path = os.path.join(outdir, html_filename)
+    io_q: queue.SimpleQueue = queue.SimpleQueue()
+    io_thread = threading.Thread(target=disk_writer, args=(io_q,), name="disk-writer", daemon=True)
+    io_thread.start()
+
+    # headless checks run concurrently: at most PLAYWRIGHT_CONCURRENCY tabs, PLAYWRIGHT_PER_HOST per origin
+    verify_sem = asyncio.Semaphore(PLAYWRIGHT_CONCURRENCY)
+    host_verify_sems: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(PLAYWRIGHT_PER_HOST))
+
+    async def report(test_url: str, payload: str, original: str, exact: bool, safe_name: str):
+        verified = False
+        if verify_with_playwright:
+            async with host_verify_sems[url_host(test_url)], verify_sem:
+                verified = await playwright_verify(browser_pool, test_url, payload, timeout=12.0)
+        # an encoded-only reflection stays 'suspect' unless the browser confirms it
+        confirmed = verified or (exact and not verify_with_playwright)
+        status = 'vulnerable' if confirmed else 'suspect'
+        io_q.put((append_text, (dashboard_path, dashboard_row(test_url if confirmed else original, payload, status, safe_name))))
+        if not (exact or verified):
+            print(Fore.YELLOW + f"[?] suspect {test_url} payload={payload}" + Style.RESET_ALL)
+            return
+        confirmed_hits.add(test_url)
+        print(Fore.MAGENTA + Style.BRIGHT + f"[>>> FOUND] {test_url} payload={payload} verified={verified} exact={exact}" + Style.RESET_ALL)
+
+    reports: List[asyncio.Task] = []
     async def consumer():
+        # runs until the None sentinel queued after all scan tasks finish
         while True:
-            try:
-                item = await asyncio.wait_for(found_q.get(), timeout=1.0)
-            except asyncio.TimeoutError:
-                if all(t.done() for t in tasks) and found_q.empty():
-                    break
-                else:
-                    continue
-            if not item:
-                continue
-            test_url, payload, text, original = item
+            item = await found_q.get()
+            if item is None:
+                break
+            test_url, payload, text, original, exact = item
             if test_url not in hits_set:
                 hits_set.add(test_url)
-                relpath = None
+                safe = safe_name_for_file(test_url)
                 if SAVE_EVIDENCE:
-                    ev_dir = ensure_dir(os.path.join(outdir, "evidence"))
-                    safe = safe_name_for_file(test_url)
-                    fn = os.path.join(ev_dir, f"{safe}__resp.html")
-                    try:
-                        async with aiofiles.open(fn, "w", encoding="utf-8") as f:
-                            await f.write(f"<!-- payload: {payload} -->\n")
-                            await f.write(text or "")
-                        relpath = os.path.relpath(fn, outdir)
-                    except Exception:
-                        relpath = None
-                verified = False
-                if verify_with_playwright:
-                    verified = await playwright_verify(test_url, payload, timeout=12.0)
-                status = 'vulnerable' if (verified or not verify_with_playwright) else 'suspect'
-                safe_name = safe_name_for_file(test_url)
-                await append_to_dashboard(outdir, html_filename, test_url if (verified or not verify_with_playwright) else original, payload, status, safe_name)
-                print(Fore.MAGENTA + Style.BRIGHT + f"[>>> FOUND] {test_url} payload={payload} verified={verified}" + Style.RESET_ALL)
+                    io_q.put((write_evidence, (os.path.join(ev_dir, f"{safe}__resp.html"), payload, text)))
+                reports.append(asyncio.create_task(report(test_url, payload, original, exact, safe)))
+        await asyncio.gather(*reports)
+    tasks = [asyncio.create_task(scan_worker()) for _ in range(min(concurrency, len(urls)))]
     consumer_task = asyncio.create_task(consumer())
-    await asyncio.gather(*tasks)
-    await consumer_task
+    # the cleanup also runs on Ctrl-C (CancelledError) or a failing worker, so the disk writer
+    # drains and the httpx pools, Chromium and the Playwright driver are always shut down
+    try:
+        await asyncio.gather(*tasks)
+        await found_q.put(None)
+        await consumer_task
+    finally:
+        for t in (*tasks, consumer_task, *reports):
+            t.cancel()
+        io_q.put(None)
+        await asyncio.to_thread(io_thread.join)
+        await session_factory.aclose()
+        if browser_pool is not None:
+            await browser_pool.close()
 
     hits_file = os.path.join(outdir, "xss_found_urls.txt")
     async with aiofiles.open(hits_file, "w", encoding="utf-8") as f:
-        for h in sorted(hits_set):
+        for h in sorted(confirmed_hits):
             await f.write(h + "\n")
 
-    print(Fore.GREEN + f"[✓] Scan finished. {len(hits_set)} hits. Report: {os.path.join(outdir, html_filename)} and {hits_file}" + Style.RESET_ALL)
+    print(Fore.GREEN + f"[✓] Scan finished. {len(confirmed_hits)} hits, {len(hits_set) - len(confirmed_hits)} suspects. Report: {os.path.join(outdir, html_filename)} and {hits_file}" + Style.RESET_ALL)
 
 # ---------------------
 # CLI: subcommands
@@ -392,10 +839,11 @@ def cmd_proxy_check(args):
         proxies = [l.strip() for l in f if l.strip() and not l.strip().startswith('#')]
     good = []
     print(f"[i] Testing {len(proxies)} proxies...")
-    for p in proxies:
-        ok, info = proxy_health_check_sync(p)
-        print(f" - {p} -> ok={ok}")
-        if ok: good.append(p)
+    # each check is a blocking request through a different proxy; run them side by side
+    with ThreadPoolExecutor(max_workers=PROXY_CHECK_WORKERS) as ex:
+        for p, (ok, info) in zip(proxies, ex.map(proxy_health_check_sync, proxies)):
+            print(f" - {p} -> ok={ok}")
+            if ok: good.append(p)
     out = args.out or "proxies_good.txt"
     with open(out, "w", encoding='utf-8') as f:
         for g in good: f.write(g + "\n")
@@ -405,10 +853,12 @@ def cmd_crawl(args):
     t = args.target
     limit = args.limit or 500
     print(Fore.CYAN + f"[~] Wayback + crawl for {t} (limit={limit})" + Style.RESET_ALL)
-    wayback = load_wayback(t, limit=limit)
-    crawled = crawl_site(f"http://{t}", max_depth=args.depth or 1, max_pages=args.max or 200)
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_wayback = ex.submit(load_wayback, t, limit=limit)
+        f_crawl = ex.submit(crawl_site, f"http://{t}", max_depth=args.depth or 1, max_pages=args.max or 200)
+        wayback, crawled = f_wayback.result(), f_crawl.result()
     combined = list(dict.fromkeys(wayback + crawled))
-    paramed = [u for u in combined if ("?" in u or "=" in u)]
+    paramed = [u for u in combined if is_param_url(u)]
     out = args.out or "crawled_urls.txt"
     with open(out, "w", encoding='utf-8') as f:
         for u in paramed: f.write(u + "\n")
@@ -426,11 +876,11 @@ def cmd_report(args):
     # build simple HTML (or reuse template)
     template = args.template if args.template and os.path.exists(args.template) else None
     async def build():
-        await write_dashboard_initial(outdir, args.html or "report.html", template)
-        # optionally append rows from evidence
-        for h in hits:
-            safe = safe_name_for_file(h)
-            await append_to_dashboard(outdir, args.html or "report.html", h, "(payload unknown)", "vulnerable", safe)
+        path = await write_dashboard_initial(outdir, args.html or "report.html", template)
+        # optionally append rows from evidence, all in one write
+        rows = "".join(dashboard_row(h, "(payload unknown)", "vulnerable", safe_name_for_file(h)) for h in hits)
+        async with aiofiles.open(path, "a", encoding="utf-8") as f:
+            await f.write(rows)
     asyncio.run(build())
     print(Fore.GREEN + f"[✓] report ready: {os.path.join(outdir, args.html or 'report.html')}" + Style.RESET_ALL)
 
@@ -480,23 +930,32 @@ async def flow_scan(ns):
     if os.path.exists(targets_arg):
         with open(targets_arg, encoding='utf-8') as f:
             urls = [l.strip() for l in f if l.strip()]
-        urls = [u for u in urls if ("?" in u or "=" in u)]
+        urls = [u for u in urls if is_param_url(u)]
     else:
         domain = targets_arg.strip()
-        wayback = load_wayback(domain, limit=limit_urls if limit_urls>0 else 500)
-        crawled = crawl_site(f"http://{domain}", max_depth=1, max_pages=200)
+        wayback, crawled = await asyncio.gather(
+            asyncio.to_thread(load_wayback, domain, limit=limit_urls if limit_urls>0 else 500),
+            asyncio.to_thread(crawl_site, f"http://{domain}", max_depth=1, max_pages=200),
+        )
         combined = list(dict.fromkeys(wayback + crawled))
-        urls = [u for u in combined if ("?" in u or "=" in u)]
+        urls = [u for u in combined if is_param_url(u)]
         if limit_urls and limit_urls>0:
             urls = urls[:limit_urls]
 
     if not urls:
         print(Fore.YELLOW + "[!] no parameterized urls found, exiting" + Style.RESET_ALL); return
 
-    full_payloads = load_payloads(XSS_PAYLOAD_FILE)
-    smoke = SMOKE_DEFAULT.copy()
+    unique = dedupe_by_signature(urls)
+    if len(unique) < len(urls):
+        print(Fore.CYAN + f"[~] skipped {len(urls) - len(unique)} urls with the same host/path/params as another" + Style.RESET_ALL)
+    urls = unique
+
+    full_payloads = prepare_payloads(load_payloads(XSS_PAYLOAD_FILE))
+    smoke = prepare_payloads(SMOKE_DEFAULT)
     if full_payloads:
         smoke = full_payloads[:min(len(full_payloads), 30)]
+        # the full pass only needs the payloads the smoke pass hasn't already sent
+        full_payloads = full_payloads[len(smoke):]
 
     print(Fore.GREEN + f"[i] scanning {len(urls)} urls | workers={workers} | proxies={len(proxies)}" + Style.RESET_ALL)
     await run_scan(urls, smoke, full_payloads, workers, proxies, outdir, html_output, verify_play, template)